@@ -4,19 +4,36 @@ Fetch latest mechanistic interpretability papers from multiple sources.
 Updates data/papers.json with new entries.
 """
 
+import io
 import json
-import urllib.request
+import urllib.error
 import urllib.parse
+import urllib.request
 import xml.etree.ElementTree as ET
-from datetime import datetime, timedelta
-import os
+from datetime import date, datetime, timedelta
 import re
+import sys
 import time
 
+from papers_io import DATA_DIR, PAPERS_FILE, read_json, write_json_atomic
+
 # Configuration
-PAPERS_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'papers.json')
+FETCH_STATE_FILE = DATA_DIR / 'fetch_state.json'
 MAX_RESULTS_PER_QUERY = 30
 DAYS_LOOKBACK = 60  # Look back 2 months
+USER_AGENT = 'MechInterpHub/1.0'
+# arXiv's API terms: at most one request every 3 seconds, over a single connection
+ARXIV_MIN_INTERVAL = 3.0
+
+# Qualified Atom tag names, matched directly against Element.tag
+ATOM = '{http://www.w3.org/2005/Atom}'
+ENTRY_TAG = ATOM + 'entry'
+ID_TAG = ATOM + 'id'
+TITLE_TAG = ATOM + 'title'
+AUTHOR_TAG = ATOM + 'author'
+NAME_TAG = ATOM + 'name'
+SUMMARY_TAG = ATOM + 'summary'
+PUBLISHED_TAG = ATOM + 'published'
 
 # Comprehensive arXiv search queries
 ARXIV_QUERIES = [
@@ -66,6 +83,37 @@ SEMANTIC_SCHOLAR_QUERIES = [
     "transformer circuit analysis",
 ]
 
+# Content keywords used by classify()
+TAG_KEYWORDS = {
+    'SAE': ['sparse autoencoder', 'sae ', 'saes'],
+    'circuits': ['circuit', 'computational graph'],
+    'superposition': ['superposition'],
+    'features': ['feature', 'monosemantic', 'polysemantic'],
+    'safety': ['safety', 'alignment', 'harmful'],
+    'probing': ['probe', 'probing', 'classifier'],
+    'attention': ['attention head', 'attention pattern'],
+    'steering': ['steering', 'activation engineering'],
+    'editing': ['model editing', 'knowledge editing'],
+    'survey': ['survey', 'review', 'overview'],
+    'theory': ['theoretical', 'theory', 'mathematical framework'],
+    'vision': ['vision', 'visual', 'multimodal', 'image'],
+    'biology': ['protein', 'dna', 'biological', 'biology'],
+    'reasoning': ['reasoning', 'chain-of-thought', 'cot'],
+}
+
+# Any of these alone marks a paper as relevant
+STRONG_TERMS = [
+    'mechanistic interpretability', 'sparse autoencoder', 'transformer circuit',
+    'activation patching', 'superposition', 'monosemantic', 'polysemantic',
+    'feature steering', 'probing classifier', 'logit lens', 'transcoder',
+    'crosscoder', 'representation engineering', 'causal tracing'
+]
+
+# Otherwise a paper needs at least one term from each of these
+INTERP_TERMS = ['interpretab', 'explain', 'understand', 'circuit', 'mechanis', 'feature']
+ML_TERMS = ['neural', 'transformer', 'language model', 'llm', 'gpt', 'bert',
+            'attention', 'deep learning', 'large language']
+
 # RSS/Atom feeds to check
 RSS_FEEDS = [
     {
@@ -76,9 +124,14 @@ RSS_FEEDS = [
 ]
 
 
-def fetch_arxiv_papers(query: str, max_results: int = 30) -> list:
-    """Fetch papers from arXiv API."""
-    base_url = 'http://export.arxiv.org/api/query?'
+def fetch_arxiv_papers(query: str, max_results: int = 30, fetch_state: dict = None) -> list:
+    """Fetch relevant papers from arXiv API.
+
+    If fetch_state is given, the request is conditional on the Last-Modified
+    value stored for this query, and the new value is recorded only if every
+    entry parsed cleanly. Unchanged results (304) yield no papers.
+    """
+    base_url = 'https://export.arxiv.org/api/query?'
 
     params = {
         'search_query': query,
@@ -90,81 +143,112 @@ def fetch_arxiv_papers(query: str, max_results: int = 30) -> list:
 
     url = base_url + urllib.parse.urlencode(params)
 
+    headers = {'User-Agent': USER_AGENT}
+    if fetch_state and fetch_state.get(query):
+        headers['If-Modified-Since'] = fetch_state[query]
+
     try:
-        req = urllib.request.Request(url, headers={'User-Agent': 'MechInterpHub/1.0'})
+        req = urllib.request.Request(url, headers=headers)
         with urllib.request.urlopen(req, timeout=30) as response:
-            data = response.read().decode('utf-8')
+            body = response.read()
+            response_headers = response.headers
+    except urllib.error.HTTPError as e:
+        if e.code == 304:  # Nothing new since the last recorded fetch
+            return []
+        print(f"Error fetching from arXiv: {e}")
+        return []
     except Exception as e:
         print(f"Error fetching from arXiv: {e}")
         return []
 
-    # Parse XML
-    root = ET.fromstring(data)
-    ns = {'atom': 'http://www.w3.org/2005/Atom', 'arxiv': 'http://arxiv.org/schemas/atom'}
+    today = date.today()
+    today_str = today.isoformat()
+    cutoff_date = today - timedelta(days=DAYS_LOOKBACK)
 
+    # Stream-parse entries, discarding each one once it has been handled
     papers = []
-    for entry in root.findall('atom:entry', ns):
-        try:
-            # Extract paper ID
-            id_elem = entry.find('atom:id', ns)
-            if id_elem is None:
+    had_errors = False
+    try:
+        context = ET.iterparse(io.BytesIO(body), events=('start', 'end'))
+        _, root = next(context)
+        for event, entry in context:
+            if event != 'end' or entry.tag != ENTRY_TAG:
                 continue
-            arxiv_id = id_elem.text.split('/abs/')[-1]
-
-            # Extract title
-            title_elem = entry.find('atom:title', ns)
-            title = title_elem.text.strip().replace('\n', ' ') if title_elem is not None else ""
-
-            # Extract authors
-            authors = []
-            for author in entry.findall('atom:author', ns):
-                name = author.find('atom:name', ns)
-                if name is not None:
-                    authors.append(name.text)
-            authors_str = ', '.join(authors[:5])
-            if len(authors) > 5:
-                authors_str += ', et al.'
-
-            # Extract abstract
-            summary_elem = entry.find('atom:summary', ns)
-            abstract = summary_elem.text.strip().replace('\n', ' ')[:500] if summary_elem is not None else ""
-
-            # Extract date
-            published_elem = entry.find('atom:published', ns)
-            if published_elem is not None:
-                date_str = published_elem.text[:10]  # YYYY-MM-DD
-            else:
-                date_str = datetime.now().strftime('%Y-%m-%d')
-
-            # Check if paper is recent enough
-            paper_date = datetime.strptime(date_str, '%Y-%m-%d')
-            cutoff_date = datetime.now() - timedelta(days=DAYS_LOOKBACK)
-            if paper_date < cutoff_date:
+            try:
+                # Check the date first: results are sorted newest first, so the
+                # first entry past the cutoff means the rest are too
+                published_elem = entry.find(PUBLISHED_TAG)
+                if published_elem is not None:
+                    date_str = published_elem.text[:10]  # YYYY-MM-DD
+                else:
+                    date_str = today_str
+                if date.fromisoformat(date_str) <= cutoff_date:
+                    break
+
+                # Extract remaining fields in a single pass over the entry's children
+                arxiv_id = None
+                title = abstract = ""
+                authors = []
+                author_count = 0
+                for child in entry:
+                    tag = child.tag
+                    if tag == ID_TAG:
+                        arxiv_id = child.text.split('/abs/')[-1]
+                    elif tag == TITLE_TAG:
+                        title = child.text.strip().replace('\n', ' ')
+                    elif tag == AUTHOR_TAG:
+                        # Only the first five names are shown; just count the rest
+                        author_count += 1
+                        if len(authors) < 5:
+                            name = child.find(NAME_TAG)
+                            if name is not None:
+                                authors.append(name.text)
+                    elif tag == SUMMARY_TAG:
+                        # Slice before cleaning up, leaving slack for leading whitespace
+                        abstract = child.text[:700].replace('\n', ' ').strip()[:500]
+                if arxiv_id is None:
+                    continue
+
+                authors_str = ', '.join(authors)
+                if author_count > 5:
+                    authors_str += ', et al.'
+
+                # Generate tags and drop papers outside mechanistic interpretability
+                tags, relevant = classify(title, abstract)
+                if not relevant:
+                    continue
+
+                papers.append({
+                    'id': f'arxiv-{arxiv_id.replace("/", "-").replace(".", "-")}',
+                    'title': title,
+                    'authors': authors_str,
+                    'date': date_str,
+                    'url': f'https://arxiv.org/abs/{arxiv_id}',
+                    'abstract': abstract,
+                    'tags': tags,
+                    'source': 'arXiv',
+                    'featured': False  # Auto-fetched papers aren't featured by default
+                })
+            except Exception as e:
+                print(f"Error parsing entry: {e}")
+                had_errors = True
                 continue
+            finally:
+                root.clear()
 
-            # Extract and generate tags
-            tags = generate_tags(title, abstract)
-
-            papers.append({
-                'id': f'arxiv-{arxiv_id.replace("/", "-").replace(".", "-")}',
-                'title': title,
-                'authors': authors_str,
-                'date': date_str,
-                'url': f'https://arxiv.org/abs/{arxiv_id}',
-                'abstract': abstract,
-                'tags': tags,
-                'source': 'arXiv',
-                'featured': False  # Auto-fetched papers aren't featured by default
-            })
-        except Exception as e:
-            print(f"Error parsing entry: {e}")
-            continue
+    except ET.ParseError as e:
+        print(f"Error parsing arXiv response: {e}")
+    else:
+        # Skip recording if any entry was dropped, so it is retried on the next run
+        last_modified = response_headers.get('Last-Modified')
+        if fetch_state is not None and last_modified and not had_errors:
+            fetch_state[query] = last_modified
 
     return papers
 
 
 def fetch_semantic_scholar(query: str, limit: int = 20) -> list:
-    """Fetch papers from Semantic Scholar API."""
+    """Fetch relevant papers from Semantic Scholar API."""
     base_url = 'https://api.semanticscholar.org/graph/v1/paper/search'
 
     params = {
@@ -178,7 +262,7 @@ def fetch_semantic_scholar(query: str, limit: int = 20) -> list:
 
     try:
         req = urllib.request.Request(url, headers={
-            'User-Agent': 'MechInterpHub/1.0',
+            'User-Agent': USER_AGENT,
         })
         with urllib.request.urlopen(req, timeout=30) as response:
             data = json.loads(response.read().decode('utf-8'))
@@ -189,23 +273,24 @@ def fetch_semantic_scholar(query: str, limit: int = 20) -> list:
     papers = []
     for paper in data.get('data', []):
         try:
+            # Skip if we'll get this from arXiv directly, before doing any other work
+            external_ids = paper.get('externalIds') or {}
+            if external_ids.get('ArXiv'):
+                continue
+
             if not paper.get('title') or not paper.get('publicationDate'):
                 continue
 
-            # Get arXiv ID if available
-            external_ids = paper.get('externalIds', {})
-            arxiv_id = external_ids.get('ArXiv')
+            abstract = paper.get('abstract', '')[:500] if paper.get('abstract') else ''
 
-            # Skip if we'll get this from arXiv directly
-            if arxiv_id:
+            tags, relevant = classify(paper.get('title', ''), abstract)
+            if not relevant:
                 continue
 
             authors = [a.get('name', '') for a in paper.get('authors', [])[:5]]
             if len(paper.get('authors', [])) > 5:
                 authors.append('et al.')
 
-            abstract = paper.get('abstract', '')[:500] if paper.get('abstract') else ''
-
             papers.append({
                 'id': f'ss-{paper.get("paperId", "")[:20]}',
                 'title': paper.get('title', ''),
@@ -213,7 +298,7 @@ def fetch_semantic_scholar(query: str, limit: int = 20) -> list:
                 'date': paper.get('publicationDate', ''),
                 'url': paper.get('url', ''),
                 'abstract': abstract,
-                'tags': generate_tags(paper.get('title', ''), abstract),
+                'tags': tags,
                 'source': 'Semantic Scholar',
                 'featured': False
             })
@@ -224,76 +309,76 @@ def fetch_semantic_scholar(query: str, limit: int = 20) -> list:
     return papers
 
 
-def generate_tags(title: str, abstract: str) -> list:
-    """Generate relevant tags based on content."""
-    tags = []
-    content = (title + ' ' + abstract).lower()
+def _contains_any(content: str, terms) -> bool:
+    """Return True if any of terms is a substring of content."""
+    for term in terms:
+        if term in content:
+            return True
+    return False
 
-    tag_keywords = {
-        'SAE': ['sparse autoencoder', 'sae ', 'saes'],
-        'circuits': ['circuit', 'computational graph'],
-        'superposition': ['superposition'],
-        'features': ['feature', 'monosemantic', 'polysemantic'],
-        'safety': ['safety', 'alignment', 'harmful'],
-        'probing': ['probe', 'probing', 'classifier'],
-        'attention': ['attention head', 'attention pattern'],
-        'steering': ['steering', 'activation engineering'],
-        'editing': ['model editing', 'knowledge editing'],
-        'survey': ['survey', 'review', 'overview'],
-        'theory': ['theoretical', 'theory', 'mathematical framework'],
-        'vision': ['vision', 'visual', 'multimodal', 'image'],
-        'biology': ['protein', 'dna', 'biological', 'biology'],
-        'reasoning': ['reasoning', 'chain-of-thought', 'cot'],
-    }
 
-    for tag, keywords in tag_keywords.items():
-        if any(kw in content for kw in keywords):
-            tags.append(tag)
-
-    return list(dict.fromkeys(tags))[:6]  # Dedupe and limit
+def classify(title: str, abstract: str) -> tuple:
+    """Generate tags and check relevance to mechanistic interpretability.
 
+    Scans the lowercased content once for both. Returns (tags, is_relevant).
+    """
+    content = (title + ' ' + abstract).lower()
 
-def is_relevant_paper(paper: dict) -> bool:
-    """Check if paper is relevant to mechanistic interpretability."""
-    title = paper.get('title', '').lower()
-    abstract = paper.get('abstract', '').lower()
-    content = title + ' ' + abstract
+    # Each tag is added at most once; stop scanning at the limit
+    tags = []
+    for tag, keywords in TAG_KEYWORDS.items():
+        if _contains_any(content, keywords):
+            tags.append(tag)
+            if len(tags) == 6:
+                break
+    tags = tuple(tags)
 
     # Strong indicators - if present, paper is relevant
-    strong_terms = [
-        'mechanistic interpretability', 'sparse autoencoder', 'transformer circuit',
-        'activation patching', 'superposition', 'monosemantic', 'polysemantic',
-        'feature steering', 'probing classifier', 'logit lens', 'transcoder',
-        'crosscoder', 'representation engineering', 'causal tracing'
-    ]
-    if any(term in content for term in strong_terms):
-        return True
-
-    # Must have interpretability-related terms
-    interp_terms = ['interpretab', 'explain', 'understand', 'circuit', 'mechanis', 'feature']
-    has_interp = any(term in content for term in interp_terms)
+    if _contains_any(content, STRONG_TERMS):
+        return tags, True
 
-    # Must have ML/neural network terms
-    ml_terms = ['neural', 'transformer', 'language model', 'llm', 'gpt', 'bert',
-                'attention', 'deep learning', 'large language']
-    has_ml = any(term in content for term in ml_terms)
-
-    return has_interp and has_ml
+    # Otherwise it needs both interpretability-related and ML/neural network terms
+    return tags, _contains_any(content, INTERP_TERMS) and _contains_any(content, ML_TERMS)
 
 
 def load_existing_papers() -> dict:
-    """Load existing papers from JSON file."""
+    """Load existing papers from JSON file.
+
+    Tags are stored as tuples of interned strings, so the handful of distinct
+    tag names are shared across all papers instead of duplicated per paper.
+    """
     try:
-        with open(PAPERS_FILE, 'r') as f:
-            return json.load(f)
+        data = read_json(PAPERS_FILE)
     except FileNotFoundError:
         return {'lastUpdated': '', 'papers': []}
+    for paper in data.get('papers', []):
+        if 'tags' in paper:
+            paper['tags'] = tuple(map(sys.intern, paper['tags']))
+    return data
 
 
 def save_papers(data: dict):
-    """Save papers to JSON file."""
-    with open(PAPERS_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
+    """Save papers to JSON file, replacing it atomically."""
+    write_json_atomic(PAPERS_FILE, data)
+
+
+def load_fetch_state() -> dict:
+    """Load the Last-Modified header recorded for each arXiv query."""
+    try:
+        return read_json(FETCH_STATE_FILE)
+    except FileNotFoundError:
+        return {}
+
+
+def save_fetch_state(state: dict):
+    """Save per-query Last-Modified headers, replacing the file atomically."""
+    # Sort keys so the committed data/fetch_state.json keeps a stable order
+    write_json_atomic(FETCH_STATE_FILE, dict(sorted(state.items())))
+
+
+def _norm_title(title: str) -> str:
+    """Normalize a title for duplicate detection."""
+    return title.casefold().strip()[:100]
 
 
 def merge_papers(existing: list, new: list) -> list:
@@ -301,7 +386,7 @@ def merge_papers(existing: list, new: list) -> list:
     # Create sets for deduplication
     existing_ids = {p.get('id', '') for p in existing}
     existing_urls = {p.get('url', '') for p in existing}
-    existing_titles = {p.get('title', '').lower().strip()[:100] for p in existing}
+    existing_titles = {_norm_title(p.get('title', '')) for p in existing}
 
     merged = list(existing)
     added_count = 0
@@ -309,13 +394,13 @@ def merge_papers(existing: list, new: list) -> list:
     for paper in new:
         paper_id = paper.get('id', '')
         paper_url = paper.get('url', '')
-        paper_title = paper.get('title', '').lower().strip()[:100]
 
         # Skip if already exists
         if paper_id in existing_ids or paper_url in existing_urls:
             continue
 
         # Skip if title is too similar to existing
+        paper_title = _norm_title(paper.get('title', ''))
         if paper_title in existing_titles:
             continue
 
@@ -340,25 +425,25 @@ def main():
     print("=" * 60)
 
     all_new_papers = []
+    fetch_state = load_fetch_state()
 
     # Fetch from arXiv
     print(f"\n[arXiv] Running {len(ARXIV_QUERIES)} queries...")
     for i, query in enumerate(ARXIV_QUERIES):
+        if i:
+            time.sleep(ARXIV_MIN_INTERVAL)  # Rate limiting
         print(f"  [{i+1}/{len(ARXIV_QUERIES)}] {query[:50]}...")
-        papers = fetch_arxiv_papers(query, max_results=MAX_RESULTS_PER_QUERY)
-        relevant = [p for p in papers if is_relevant_paper(p)]
-        all_new_papers.extend(relevant)
-        print(f"    Found {len(relevant)} relevant papers")
-        time.sleep(3)  # Rate limiting
+        papers = fetch_arxiv_papers(query, MAX_RESULTS_PER_QUERY, fetch_state)
+        all_new_papers.extend(papers)
+        print(f"    Found {len(papers)} relevant papers")
 
     # Fetch from Semantic Scholar
     print(f"\n[Semantic Scholar] Running {len(SEMANTIC_SCHOLAR_QUERIES)} queries...")
     for query in SEMANTIC_SCHOLAR_QUERIES:
         print(f"  Querying: {query}...")
         papers = fetch_semantic_scholar(query, limit=20)
-        relevant = [p for p in papers if is_relevant_paper(p)]
-        all_new_papers.extend(relevant)
-        print(f"    Found {len(relevant)} relevant papers")
+        all_new_papers.extend(papers)
+        print(f"    Found {len(papers)} relevant papers")
         time.sleep(1)
 
     print(f"\nTotal potentially relevant papers found: {len(all_new_papers)}")
@@ -370,13 +455,20 @@ def main():
 
     merged_papers = merge_papers(existing_papers, all_new_papers)
 
-    # Update data
-    existing_data['papers'] = merged_papers
-    existing_data['lastUpdated'] = datetime.now().strftime('%Y-%m-%d')
+    # Nothing new: skip rewriting the whole database
+    if len(merged_papers) == len(existing_papers):
+        print("\nNo new papers; database unchanged")
+    else:
+        # Update data
+        existing_data['papers'] = merged_papers
+        existing_data['lastUpdated'] = datetime.now().strftime('%Y-%m-%d')
+
+        # Save
+        save_papers(existing_data)
+        print(f"\nSaved {len(merged_papers)} total papers")
 
-    # Save
-    save_papers(existing_data)
-    print(f"\nSaved {len(merged_papers)} total papers")
+    # Record Last-Modified headers only once their results have been merged
+    save_fetch_state(fetch_state)
     print("=" * 60)
 
 
@@ -3,37 +3,51 @@
 Generate RSS feed from papers.json
 """
 
-import json
-import os
-from datetime import datetime
-import html
+from datetime import date
 
-PAPERS_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'papers.json')
-RSS_FILE = os.path.join(os.path.dirname(__file__), '..', 'feed.xml')
+from papers_io import PAPERS_FILE, ROOT_DIR, read_json
+
+RSS_FILE = ROOT_DIR / 'feed.xml'
 SITE_URL = 'https://izkula.github.io/cc'
 
+# English names for RFC 822 dates, independent of the process locale
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+          'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+# Same replacements as html.escape, applied in a single str.translate pass
+_XML_ESCAPES = str.maketrans({
+    '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#x27;',
+})
+
 def escape_xml(text: str) -> str:
     """Escape special XML characters."""
-    return html.escape(str(text))
+    return str(text).translate(_XML_ESCAPES)
+
+def format_rss_date(d: date) -> str:
+    """Format a date as an RFC 822 timestamp at midnight UTC."""
+    return f'{WEEKDAYS[d.weekday()]}, {d.day:02d} {MONTHS[d.month - 1]} {d.year} 00:00:00 +0000'
+
+def to_rss_date(value: str, fallback: str) -> str:
+    """Format a YYYY-MM-DD string for RSS, or return fallback if it isn't one."""
+    try:
+        return format_rss_date(date.fromisoformat(value))
+    except (TypeError, ValueError):
+        return fallback
 
 def generate_rss():
     """Generate RSS feed from papers data."""
     # Load papers
-    with open(PAPERS_FILE, 'r') as f:
-        data = json.load(f)
+    data = read_json(PAPERS_FILE)
 
     papers = data.get('papers', [])[:30]  # Latest 30 papers
-    last_updated = data.get('lastUpdated', datetime.now().strftime('%Y-%m-%d'))
+    last_updated = data.get('lastUpdated', '')
 
     # Format date for RSS
-    try:
-        pub_date = datetime.strptime(last_updated, '%Y-%m-%d')
-        rss_date = pub_date.strftime('%a, %d %b %Y 00:00:00 +0000')
-    except:
-        rss_date = datetime.now().strftime('%a, %d %b %Y 00:00:00 +0000')
+    rss_date = to_rss_date(last_updated, format_rss_date(date.today()))
 
-    # Generate RSS XML
-    rss = f'''<?xml version="1.0" encoding="UTF-8"?>
+    # Generate RSS XML, collecting parts and joining once at the end
+    parts = [f'''<?xml version="1.0" encoding="UTF-8"?>
 <rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom">
   <channel>
     <title>Mechanistic Interpretability Hub</title>
@@ -42,22 +56,16 @@ def generate_rss():
     <language>en-us</language>
     <lastBuildDate>{rss_date}</lastBuildDate>
     <atom:link href="{SITE_URL}/feed.xml" rel="self" type="application/rss+xml"/>
-'''
+''']
 
     for paper in papers:
         title = escape_xml(paper.get('title', 'Untitled'))
         url = escape_xml(paper.get('url', ''))
         authors = escape_xml(paper.get('authors', 'Unknown'))
         abstract = escape_xml(paper.get('abstract', ''))
-        date = paper.get('date', '')
         tags = paper.get('tags', [])
 
-        # Format date for RSS
-        try:
-            paper_date = datetime.strptime(date, '%Y-%m-%d')
-            paper_rss_date = paper_date.strftime('%a, %d %b %Y 00:00:00 +0000')
-        except:
-            paper_rss_date = rss_date
+        paper_rss_date = to_rss_date(paper.get('date', ''), rss_date)
 
         # Create description with authors and abstract
         description = f"<p><strong>Authors:</strong> {authors}</p>"
@@ -66,23 +74,23 @@ def generate_rss():
         if tags:
             description += f"<p><strong>Tags:</strong> {', '.join(tags)}</p>"
 
-        rss += f'''
+        parts.append(f'''
     <item>
       <title>{title}</title>
       <link>{url}</link>
       <description><![CDATA[{description}]]></description>
       <pubDate>{paper_rss_date}</pubDate>
       <guid>{url}</guid>
-    </item>'''
+    </item>''')
 
-    rss += '''
+    parts.append('''
   </channel>
 </rss>
-'''
+''')
 
     # Write RSS file
-    with open(RSS_FILE, 'w') as f:
-        f.write(rss)
+    with RSS_FILE.open('w') as f:
+        f.write(''.join(parts))
 
     print(f"Generated RSS feed with {len(papers)} papers")
 
@@ -0,0 +1,33 @@
+"""
+Shared data file paths and JSON helpers for the update scripts.
+"""
+
+import json
+from pathlib import Path
+
+try:
+    import orjson  # Optional: faster loading of papers.json
+except ImportError:
+    orjson = None
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+DATA_DIR = ROOT_DIR / 'data'
+PAPERS_FILE = DATA_DIR / 'papers.json'
+
+
+def read_json(path: Path):
+    """Load a JSON file, using orjson when it is installed."""
+    raw = path.read_bytes()
+    return orjson.loads(raw) if orjson else json.loads(raw)
+
+
+def write_json_atomic(path: Path, data):
+    """Write JSON to a temporary file and move it over path.
+
+    Always uses stdlib json so committed files are byte-identical whether or
+    not orjson is installed (orjson does not escape non-ASCII characters).
+    """
+    tmp_file = path.with_name(path.name + '.tmp')
+    with tmp_file.open('w') as f:
+        json.dump(data, f, indent=2)
+    tmp_file.replace(path)